@@ -6,10 +6,24 @@ This module centralizes all configuration parameters used across the application
 ensuring consistency and making it easy to add or modify cities and API settings.
 """
 
+import os
+import tempfile
+from dotenv import load_dotenv
+
+# ========== ENVIRONMENT ==========
+# Load .env once, when config is first imported - other modules read environment
+# settings from here instead of calling load_dotenv themselves
+load_dotenv()
+
+# Telegram bot token (TELEGRAM_TOKEN in .env); None if missing - modules that
+# need it raise at import
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+
 # ========== CITY CONFIGURATION ==========
 # Dictionary mapping NITE API city IDs to city information
 # Keys (1,2,3,5) are city_id values returned from NITE API
-# Each city has: name (Hebrew), db_column (database field), display_order (UI sort order)
+# Each city has: name (Hebrew), db_column (legacy per-city column in users - read only
+# when init_db migrates an old database), display_order (UI sort order)
 CITIES = {
     1: {"name": "חיפה", "db_column": "haifa", "display_order": 4},
     2: {"name": "תל אביב", "db_column": "tel_aviv", "display_order": 1},
@@ -17,6 +31,16 @@ CITIES = {
     5: {"name": "באר שבע", "db_column": "beer_sheva", "display_order": 2}
 }
 
+# Derived lookups - CITIES is static, so these are computed once at import time
+# City names sorted by display_order, e.g. ['תל אביב', 'באר שבע', 'ירושלים', 'חיפה']
+CITY_OPTIONS_LIST = [
+    city["name"] for city in sorted(CITIES.values(), key=lambda x: x["display_order"])
+]
+# Hebrew city name -> NITE API city ID, e.g. {'תל אביב': 2, ...}
+CITY_IDS_MAP = {city["name"]: city_id for city_id, city in CITIES.items()}
+# NITE API city ID -> Hebrew city name, e.g. {2: 'תל אביב', ...}
+CITY_NAMES = {city_id: city["name"] for city_id, city in CITIES.items()}
+
 def get_city_name(city_id: int) -> str:
     """
     Convert NITE API city_id to Hebrew city name.
@@ -30,19 +54,6 @@ def get_city_name(city_id: int) -> str:
     city = CITIES.get(city_id)
     return city["name"] if city else f"עיר לא ידועה ({city_id})"
 
-def get_city_column(city_id: int) -> str | None:
-    """
-    Get database column name for a given city ID.
-    
-    Args:
-        city_id: City identifier from NITE API
-    
-    Returns:
-        Database column name (e.g., 'tel_aviv'), or None if city not found
-    """
-    city = CITIES.get(city_id)
-    return city["db_column"] if city else None
-
 def get_city_options() -> list[str]:
     """
     Get list of city names sorted by display order for UI presentation.
@@ -50,24 +61,18 @@ def get_city_options() -> list[str]:
     Returns:
         List of Hebrew city names sorted by display_order field
         Example: ['תל אביב', 'באר שבע', 'ירושלים', 'חיפה']
-    """
-    sorted_cities = sorted(CITIES.values(), key=lambda x: x["display_order"])
-    return [city["name"] for city in sorted_cities]
-
-def get_city_columns_map() -> dict[str, str]:
-    """
-    Create mapping from Hebrew city names to database column names.
     
-    Returns:
-        Dictionary mapping city names to DB columns
-        Example: {'תל אביב': 'tel_aviv', 'חיפה': 'haifa', ...}
+    Note:
+        Returns the shared CITY_OPTIONS_LIST - callers must not mutate it.
     """
-    return {city["name"]: city["db_column"] for city in CITIES.values()}
+    return CITY_OPTIONS_LIST
 
 
 # ========== DATABASE ==========
-# SQLite database filename for storing exams, logs, and users
-DB_FILE = "exams_data.db"
+# SQLite database filename for storing exams, logs, and users (DB_FILE in .env).
+# WAL mode keeps exams_data.db-wal/-shm next to it, so in Docker this must be
+# inside a mounted directory, not a single bind-mounted file
+DB_FILE = os.getenv("DB_FILE", "exams_data.db")
 
 # ========== API ==========
 # NITE (National Institute for Testing and Evaluation) API endpoints
@@ -84,9 +89,38 @@ NITE_API_HEADERS = {
                   "Chrome/139.0.0.0 Safari/537.36"
 }
 
+# TLS for the API host is verified by default. NITE_CA_BUNDLE (PEM path) pins the
+# CA bundle to verify against - e.g. if the host serves an incomplete chain.
+# NITE_VERIFY_TLS=0 turns verification off for the API host (last resort).
+NITE_CA_BUNDLE = os.getenv("NITE_CA_BUNDLE")
+NITE_VERIFY_TLS = os.getenv("NITE_VERIFY_TLS", "1") != "0"
+
 # ========== CHECKER ==========
 # Time intervals for exam checking loop (in seconds)
 CHECK_INTERVAL_MIN = 120  # Minimum wait time: 2 minutes
 CHECK_INTERVAL_MAX = 240  # Maximum wait time: 4 minutes
+# Right after the schedule changes (exams tend to appear in bursts), check sooner
+CHECK_INTERVAL_ACTIVE_MIN = 60   # 1 minute
+CHECK_INTERVAL_ACTIVE_MAX = 120  # 2 minutes
+# While it stays unchanged, the maximum grows by this much per quiet check...
+CHECK_INTERVAL_QUIET_STEP = 30
+# ...up to this cap (10 minutes)
+CHECK_INTERVAL_QUIET_MAX = 600
+# Retry delay after a failed fetch: doubles per consecutive failure, capped
+CHECK_BACKOFF_BASE = 15   # First retry after 15 seconds
+CHECK_BACKOFF_MAX = 600   # Never wait more than 10 minutes
+# Checks between reloads of the in-memory exam state from the database
+CHECK_RECONCILE_EVERY = 30
 # HTTP request timeout (in seconds)
 REQUEST_TIMEOUT = 10
+
+# ========== TELEGRAM BOT ==========
+# Long-polling timeout for getUpdates (in seconds) - Telegram holds the request
+# open until an update arrives, so fewer empty round-trips are made
+BOT_POLLING_TIMEOUT = 20
+# Lock file held by the running bot so a second instance exits instead of
+# competing for getUpdates with the same token (Telegram 409 Conflict)
+BOT_LOCK_FILE = os.path.join(tempfile.gettempdir(), "amirnet_bot.lock")
+# Lock file held by the running checker so a second one can't send duplicate
+# notifications or race on the exams table
+CHECKER_LOCK_FILE = os.path.join(tempfile.gettempdir(), "amirnet_checker.lock")
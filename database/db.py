@@ -2,123 +2,312 @@
 Database layer for NITE exam checker bot.
 
 This module handles all SQLite database operations for managing exam schedules,
-user subscriptions, and event logging. It maintains four tables:
+user subscriptions, and event logging. It maintains five tables:
     - exams: Current active exams
     - exam_log: Historical record of all exam changes
-    - users: Telegram user subscription preferences by city
-    - whatsapp_users: WhatsApp user subscription preferences by city
+    - users: Registered Telegram users
+    - whatsapp_users: Registered WhatsApp users
+    - subscriptions: One row per (platform, user, city) subscription
 
 Dependencies:
     - sqlite3: SQLite database operations
+    - sys: String interning for exam dates
     - logging: Application logging
-    - datetime: Timestamp generation
     - config: Centralized configuration (DB_FILE, city mappings)
 
 Functions:
-    - get_connection: Create database connection
+    - get_connection: Return the calling thread's database connection
+    - close_connection: Close all database connections
     - init_db: Initialize database schema
     - get_current_exams: Retrieve all active exams
     - add_exam: Insert new exam and log creation
     - remove_exam: Delete exam and log removal
+    - add_exams: Insert a batch of exams and log creations in one transaction
+    - remove_exams: Delete a batch of exams and log removals in one transaction
     - add_user: Register new Telegram user
     - update_user_cities: Update Telegram user's city subscriptions
     - get_users_by_city: Query Telegram users subscribed to specific city
+    - get_users_by_cities: Query Telegram subscribers of several cities at once
+    - iter_users_by_city: Yield Telegram subscribers of a city in small batches
     - add_whatsapp_user: Register new WhatsApp user
     - update_whatsapp_user_cities: Update WhatsApp user's city subscriptions
     - get_whatsapp_users_by_city: Query WhatsApp users subscribed to specific city
+    - get_whatsapp_users_by_cities: Query WhatsApp subscribers of several cities at once
 """
 
+import sys
+import atexit
 import sqlite3
 import logging
-from datetime import datetime
-from config import DB_FILE, get_city_columns_map
+import threading
+from collections.abc import Iterable
+from contextlib import contextmanager
+from config import DB_FILE, CITIES, CITY_IDS_MAP
+
+# Platform values stored in subscriptions.platform
+_TELEGRAM = "telegram"
+_WHATSAPP = "whatsapp"
+
+# Registration table for each platform (subscriptions.user_id refers to these)
+_PLATFORM_TABLES = {_TELEGRAM: "users", _WHATSAPP: "whatsapp_users"}
+
+# City IDs accepted by subscriber queries
+_VALID_CITY_IDS = frozenset(CITIES)
+
+# Rows fetched per fetchmany() call when reading subscriber lists
+_FETCH_CHUNK = 1000
 
 # ----------------------------
 # Utility Functions
 # ----------------------------
 
-def get_connection():
+# Per-thread connections, opened lazily by get_connection(). The checker and the
+# bot's worker threads each get their own, so no lock is needed and WAL lets
+# readers run alongside a writer.
+_local = threading.local()
+# Every connection opened so far, so close_connection() can close them all
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+def get_connection() -> sqlite3.Connection:
     """
-    Create and return a connection to the SQLite database.
+    Return the calling thread's SQLite connection, opening it on first use.
     
     Returns:
-        sqlite3.Connection: Active database connection object
+        sqlite3.Connection: This thread's connection in autocommit mode
+    
+    Connection Setup (first call per thread only):
+        - synchronous=NORMAL: with WAL, one fsync per checkpoint instead of
+          per commit (still crash-safe)
+        - temp_store=MEMORY: temp tables and indices stay in RAM
+        - mmap_size=256MB: reads go through memory-mapped I/O
+        - cache_size=-65536: ~64MB page cache
+        - busy_timeout=5000: wait up to 5 seconds for another connection's
+          write lock (another thread, or nite_check.py and the bot run
+          separately) instead of failing with "database is locked"
+    
+    Note:
+        These are per-connection settings. journal_mode=WAL is persistent in
+        the database file, so init_db() sets it once instead.
+        The connection stays open for the thread's lifetime and is reused by
+        every call. Multi-statement writes should use _transaction().
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # check_same_thread=False only so close_connection() can close it at exit
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+        conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-65536;
+            PRAGMA busy_timeout=5000;
+        """)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+def close_connection():
+    """
+    Close every connection opened by this process.
+    
+    Note:
+        Registered with atexit so the WAL is checkpointed on clean shutdown.
+        Runs PRAGMA optimize first, which ANALYZEs tables whose statistics
+        are stale so the planner keeps choosing the indexes as data grows.
+        Later get_connection() calls open new connections.
+        The checker's daemon thread may still be mid-transaction if it outlived
+        the shutdown join: optimize is skipped there, and a failure on one
+        connection is logged without leaving the others open.
+    """
+    global _local
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                if not conn.in_transaction:
+                    conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error as e:
+                logging.warning(f"Error closing database connection: {e}")
+        _connections.clear()
+        _local = threading.local()
+
+atexit.register(close_connection)
+
+@contextmanager
+def _transaction():
+    """
+    Run several statements atomically on this thread's connection.
+    
+    Yields:
+        sqlite3.Connection: This thread's connection inside an open transaction
     
     Note:
-        Connection should be used with context manager (with statement)
-        to ensure proper closure and transaction handling.
+        BEGIN IMMEDIATE takes the write lock up front (waiting up to
+        busy_timeout), so a transaction that reads before writing can't fail
+        midway because another connection wrote first.
+        Commits on success, rolls back on error.
     """
-    return sqlite3.connect(DB_FILE)
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
 # ----------------------------
 # Database Initialization
 # ----------------------------
 
+# Full schema, run by init_db() as one executescript call. Starts a transaction
+# and leaves it open for init_db to finish (migration, then COMMIT).
+_SCHEMA = """
+BEGIN IMMEDIATE;
+
+-- Table 1: Current state of exams
+CREATE TABLE IF NOT EXISTS exams (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    exam_date TEXT NOT NULL,
+    city_id INTEGER NOT NULL,
+    first_seen TIMESTAMP NOT NULL,
+    UNIQUE(exam_date, city_id)
+);
+
+-- Table 2: Event history (log)
+CREATE TABLE IF NOT EXISTS exam_log (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    exam_date TEXT NOT NULL,
+    city_id INTEGER NOT NULL,
+    event_type TEXT NOT NULL,  -- 'CREATED' or 'DELETED'
+    event_timestamp TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_exams_city ON exams(city_id);
+CREATE INDEX IF NOT EXISTS idx_log_ts ON exam_log(event_timestamp);
+
+-- exam_log is written by triggers, so every change to exams is logged
+-- by the same statement (local time, matching first_seen)
+CREATE TRIGGER IF NOT EXISTS trg_exam_ins AFTER INSERT ON exams
+BEGIN
+    INSERT INTO exam_log (exam_date, city_id, event_type, event_timestamp)
+    VALUES (NEW.exam_date, NEW.city_id, 'CREATED', NEW.first_seen);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_exam_del AFTER DELETE ON exams
+BEGIN
+    INSERT INTO exam_log (exam_date, city_id, event_type, event_timestamp)
+    VALUES (OLD.exam_date, OLD.city_id, 'DELETED', datetime('now', 'localtime'));
+END;
+
+-- Table 3: users (Telegram)
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY
+);
+
+-- Table 4: whatsapp_users (WhatsApp)
+CREATE TABLE IF NOT EXISTS whatsapp_users (
+    user_id TEXT PRIMARY KEY
+);
+
+-- Table 5: subscriptions (one row per subscribed city)
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id TEXT NOT NULL,
+    platform TEXT NOT NULL,  -- 'telegram' or 'whatsapp'
+    city_id INTEGER NOT NULL,
+    PRIMARY KEY (platform, user_id, city_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_subs_city_user ON subscriptions(platform, city_id, user_id);
+"""
+
 def init_db():
     """
     Initialize database schema by creating all required tables.
     
-    Creates four tables if they don't exist:
+    Creates five tables if they don't exist:
         1. exams: Stores current active exams with unique constraint on (exam_date, city_id)
         2. exam_log: Audit log of all exam additions and removals
-        3. users: Telegram user subscriptions with boolean columns for each city
-        4. whatsapp_users: WhatsApp user subscriptions with boolean columns for each city
+        3. users: Registered Telegram users
+        4. whatsapp_users: Registered WhatsApp users
+        5. subscriptions: City subscriptions for users of both platforms
     
     Table Structure:
         exams: id, exam_date, city_id, first_seen
         exam_log: log_id, exam_date, city_id, event_type, event_timestamp
-        users: user_id (INTEGER), tel_aviv, beer_sheva, jerusalem, haifa
-        whatsapp_users: user_id (TEXT), tel_aviv, beer_sheva, jerusalem, haifa
+        users: user_id (INTEGER)
+        whatsapp_users: user_id (TEXT)
+        subscriptions: user_id (TEXT), platform ('telegram'/'whatsapp'), city_id
+    
+    Indexes:
+        idx_exams_city: exams(city_id)
+        idx_log_ts: exam_log(event_timestamp) for recent-changes queries
+        idx_subs_city_user: (platform, city_id, user_id) - covers notification
+        fan-out lookups, so they never read the subscriptions table itself
+    
+    Triggers:
+        trg_exam_ins / trg_exam_del: write the 'CREATED' / 'DELETED' row to
+        exam_log for every insert into / delete from exams
+    
+    Migration:
+        Databases created before the subscriptions table stored one boolean
+        column per city in users/whatsapp_users. Those flags are copied into
+        subscriptions once, when the table is first created.
+    
+    Journal Mode:
+        Switches the database file to WAL (persistent, so once is enough):
+        readers no longer block the writer and commits avoid the rollback
+        journal's extra fsync.
     
     Note:
-        Safe to call multiple times - uses CREATE TABLE IF NOT EXISTS.
-    """
-    with get_connection() as conn:
-        # Table 1: Current state of exams
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS exams (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                exam_date TEXT NOT NULL,
-                city_id INTEGER NOT NULL,
-                first_seen TIMESTAMP NOT NULL,
-                UNIQUE(exam_date, city_id)
-            )
-        """)
+        Safe to call multiple times - uses CREATE TABLE/INDEX IF NOT EXISTS.
+        The DDL is one script (_SCHEMA) parsed and run in a single call.
+    """
+    conn = get_connection()
+    # journal_mode can't change inside a transaction - set it before the DDL
+    conn.execute("PRAGMA journal_mode=WAL")
 
-        # Table 2: Event history (log)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS exam_log (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                exam_date TEXT NOT NULL,
-                city_id INTEGER NOT NULL,
-                event_type TEXT NOT NULL,  -- 'CREATED' or 'DELETED'
-                event_timestamp TIMESTAMP NOT NULL
-            )
-        """)
+    needs_migration = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subscriptions'"
+    ).fetchone() is None
 
-        # Table 3: users (Telegram)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                tel_aviv INTEGER DEFAULT 0,
-                beer_sheva INTEGER DEFAULT 0,
-                jerusalem INTEGER DEFAULT 0,
-                haifa INTEGER DEFAULT 0
-            )
-        """)
+    # _SCHEMA opens the transaction itself (executescript commits any open
+    # one first), so the migration below lands in the same transaction
+    try:
+        conn.executescript(_SCHEMA)
+        if needs_migration:
+            _migrate_city_columns(conn)
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    logging.info("Database initialized successfully.")
 
-        # Table 4: whatsapp_users (WhatsApp)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS whatsapp_users (
-                user_id TEXT PRIMARY KEY,
-                tel_aviv INTEGER DEFAULT 0,
-                beer_sheva INTEGER DEFAULT 0,
-                jerusalem INTEGER DEFAULT 0,
-                haifa INTEGER DEFAULT 0
+def _migrate_city_columns(conn: sqlite3.Connection):
+    """
+    Copy legacy per-city boolean columns into the subscriptions table.
+    
+    Args:
+        conn: Connection inside init_db's transaction
+    
+    Note:
+        Only columns that exist are read, so a fresh database is a no-op.
+        The legacy columns are left in place but no longer read or written.
+    """
+    for platform, table in _PLATFORM_TABLES.items():
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for city_id, city in CITIES.items():
+            column = city["db_column"]
+            if column not in columns:
+                continue
+            conn.execute(
+                f"""INSERT OR IGNORE INTO subscriptions (user_id, platform, city_id)
+                    SELECT user_id, ?, ? FROM {table} WHERE {column} = 1""",
+                (platform, city_id)
             )
-        """)
-        conn.commit()
-    logging.info("Database initialized successfully.")
 
 # ----------------------------
 # Exam Management Functions
@@ -133,11 +322,13 @@ def get_current_exams():
              Example: {('2025-11-04', 3), ('2025-11-05', 2)}
     
     Note:
-        Used by checker bot to compare API data with database state.
+        Used by the checker at startup (and periodically) to load the exam state it
+        then keeps in memory.
     """
-    with get_connection() as conn:
-        rows = conn.execute("SELECT exam_date, city_id FROM exams").fetchall()
-        return set(rows)
+    conn = get_connection()
+    rows = conn.execute("SELECT exam_date, city_id FROM exams").fetchall()
+    # Intern dates like nite_api does, so pairs from both sides share strings
+    return {(sys.intern(date), city_id) for date, city_id in rows}
 
 def add_exam(date: str, city_id: int):
     """
@@ -149,26 +340,13 @@ def add_exam(date: str, city_id: int):
     
     Side Effects:
         - Inserts row into 'exams' table with current timestamp
-        - Logs 'CREATED' event to 'exam_log' table
-        - Commits transaction
+        - Logs 'CREATED' event to 'exam_log' table (via trg_exam_ins)
     
     Note:
         Should only be called after confirming exam doesn't exist in DB.
+        Single-row form of add_exams - prefer add_exams for several exams.
     """
-    now = datetime.now()
-    with get_connection() as conn:
-        # Add to the current state table
-        conn.execute(
-            "INSERT INTO exams (exam_date, city_id, first_seen) VALUES (?, ?, ?)",
-            (date, city_id, now)
-        )
-        # Log the event
-        conn.execute(
-            """INSERT INTO exam_log (exam_date, city_id, event_type, event_timestamp)
-               VALUES (?, ?, 'CREATED', ?)""",
-            (date, city_id, now)
-        )
-        conn.commit()
+    add_exams([(date, city_id)])
 
 def remove_exam(date: str, city_id: int):
     """
@@ -180,26 +358,157 @@ def remove_exam(date: str, city_id: int):
     
     Side Effects:
         - Deletes matching row from 'exams' table
-        - Logs 'DELETED' event to 'exam_log' table
-        - Commits transaction
+        - Logs 'DELETED' event to 'exam_log' table (via trg_exam_del)
     
     Note:
         Called when exam no longer appears in API response (exam was cancelled/removed).
         Does not send notifications to users - handled by caller.
+        Single-row form of remove_exams - prefer remove_exams for several exams.
     """
-    with get_connection() as conn:
-        # Remove from the current state table
-        conn.execute(
+    remove_exams([(date, city_id)])
+
+def add_exams(pairs: list[tuple[str, int]]):
+    """
+    Add a batch of new exams and log their creation in a single transaction.
+    
+    Args:
+        pairs: List of (exam_date, city_id) tuples
+               Example: [('2025-11-04', 3), ('2025-11-05', 2)]
+    
+    Side Effects:
+        - Inserts one row per pair into 'exams' table, stamped with SQLite's
+          local time (datetime('now', 'localtime'))
+        - Logs one 'CREATED' event per pair to 'exam_log' (via trg_exam_ins)
+    
+    Note:
+        Batch version of add_exam - one commit for the whole checker cycle
+        instead of one per exam. Empty input is a no-op.
+        Pairs already in 'exams' (e.g. added out-of-band since the checker last
+        reloaded its state) are skipped instead of failing the whole batch;
+        no 'CREATED' event is logged for them.
+    """
+    if not pairs:
+        return
+    with _transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO exams (exam_date, city_id, first_seen) "
+            "VALUES (?, ?, datetime('now', 'localtime'))",
+            pairs
+        )
+
+def remove_exams(pairs: list[tuple[str, int]]):
+    """
+    Remove a batch of exams and log their deletion in a single transaction.
+    
+    Args:
+        pairs: List of (exam_date, city_id) tuples
+    
+    Side Effects:
+        - Deletes matching rows from 'exams' table
+        - Logs one 'DELETED' event per deleted row to 'exam_log' (via trg_exam_del)
+    
+    Note:
+        Batch version of remove_exam. Empty input is a no-op.
+    """
+    if not pairs:
+        return
+    with _transaction() as conn:
+        conn.executemany(
             "DELETE FROM exams WHERE exam_date = ? AND city_id = ?",
-            (date, city_id)
+            pairs
         )
-        # Log the event
+
+# ----------------------------
+# Subscription Helpers
+# ----------------------------
+
+def _set_subscriptions(platform: str, user_id, cities: Iterable[str]):
+    """
+    Replace a user's subscriptions with the given cities in one transaction.
+    
+    Args:
+        platform: _TELEGRAM or _WHATSAPP
+        user_id: Platform user ID (stored as TEXT)
+        cities: Hebrew city names; unknown names are ignored
+    """
+    # Deduplicate (rows share a primary key) without copying an existing set
+    selected = cities if isinstance(cities, (set, frozenset)) else set(cities)
+    rows = [
+        (str(user_id), platform, CITY_IDS_MAP[city])
+        for city in selected if city in CITY_IDS_MAP
+    ]
+    with _transaction() as conn:
         conn.execute(
-            """INSERT INTO exam_log (exam_date, city_id, event_type, event_timestamp)
-               VALUES (?, ?, 'DELETED', ?)""",
-            (date, city_id, datetime.now())
+            "DELETE FROM subscriptions WHERE platform = ? AND user_id = ?",
+            (platform, str(user_id))
         )
-        conn.commit()
+        conn.executemany(
+            "INSERT INTO subscriptions (user_id, platform, city_id) VALUES (?, ?, ?)",
+            rows
+        )
+
+def _check_city_id(city_id: int):
+    """
+    Raise ValueError if city_id is not a configured city.
+    
+    Note:
+        Guards against a caller passing a column name or an unknown API ID,
+        which would otherwise silently return no subscribers.
+    """
+    if city_id not in _VALID_CITY_IDS:
+        raise ValueError(f"Unknown city_id: {city_id!r}")
+
+def _get_subscribers(platform: str, city_id: int) -> list[str]:
+    """
+    Return user IDs (as stored TEXT) subscribed to a city on a platform.
+    
+    Raises:
+        ValueError: If city_id is not in config.CITIES
+    
+    Note:
+        Served entirely from idx_subs_city_user (covering index seek).
+        Rows are read in _FETCH_CHUNK batches straight into one list; the
+        whole list is still built, so use iter_users_by_city to stream
+        very large subscriber lists instead.
+    """
+    _check_city_id(city_id)
+    user_ids = []
+    cursor = get_connection().execute(
+        "SELECT user_id FROM subscriptions WHERE platform = ? AND city_id = ?",
+        (platform, city_id)
+    )
+    while rows := cursor.fetchmany(_FETCH_CHUNK):
+        user_ids.extend(row[0] for row in rows)
+    return user_ids
+
+def _get_subscribers_by_cities(platform: str, city_ids: Iterable[int]) -> dict[int, list[str]]:
+    """
+    Return user IDs (as stored TEXT) per city for several cities in one query.
+    
+    Raises:
+        ValueError: If any city_id is not in config.CITIES
+    
+    Note:
+        One IN (...) query instead of one query per city, still served from
+        idx_subs_city_user. Every requested city gets a key, even with no
+        subscribers.
+    """
+    city_ids = set(city_ids)
+    for city_id in city_ids:
+        _check_city_id(city_id)
+    subscribers = {city_id: [] for city_id in city_ids}
+    if not city_ids:
+        return subscribers
+    placeholders = ", ".join("?" * len(city_ids))
+    cursor = get_connection().execute(
+        f"SELECT city_id, user_id FROM subscriptions "
+        f"WHERE platform = ? AND city_id IN ({placeholders})",
+        (platform, *city_ids)
+    )
+    while rows := cursor.fetchmany(_FETCH_CHUNK):
+        for city_id, user_id in rows:
+            subscribers[city_id].append(user_id)
+    return subscribers
 
 # ----------------------------
 # User Management Functions
@@ -213,84 +522,120 @@ def add_user(user_id: int):
         user_id: Telegram user ID (unique identifier)
     
     Side Effects:
-        - Inserts new row into 'users' table with all city subscriptions set to 0
+        - Inserts new row into 'users' table (no city subscriptions yet)
         - Uses INSERT OR IGNORE to prevent duplicate key errors
-        - Commits transaction
     
     Note:
         Called when user first sends /start command to the bot.
         If user already exists, operation is silently ignored.
     """
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO users (user_id)
-            VALUES (?)
-            """,
-            (user_id,)
-        )
-        conn.commit()
+    conn = get_connection()
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO users (user_id)
+        VALUES (?)
+        """,
+        (user_id,)
+    )
 
-def update_user_cities(user_id: int, cities: list[str]):
+def update_user_cities(user_id: int, cities: Iterable[str]):
     """
     Update user's city subscription preferences.
     
     Args:
         user_id: Telegram user ID
-        cities: List of Hebrew city names user wants to subscribe to
+        cities: Hebrew city names user wants to subscribe to (any iterable)
                 Example: ['תל אביב', 'חיפה']
     
     Side Effects:
-        - Updates all city columns in 'users' table for given user_id
-        - Sets matching cities to 1 (subscribed), others to 0 (unsubscribed)
-        - Commits transaction
+        - Replaces the user's rows in 'subscriptions' (platform 'telegram')
+          with one row per selected city, in a single transaction
     
     Implementation:
-        Uses get_city_columns_map() to convert Hebrew names to DB column names.
-        Dynamically builds UPDATE query for all city columns.
+        Uses CITY_IDS_MAP to convert Hebrew names to NITE city IDs.
     """
-    city_columns = get_city_columns_map()
+    _set_subscriptions(_TELEGRAM, user_id, cities)
 
-    # Create dict: {db_column: 1 or 0} based on whether city is in user's selection
-    updates = {column: (1 if city in cities else 0) for city, column in city_columns.items()}
-
-    with get_connection() as conn:
-        conn.execute(
-            f"""
-            UPDATE users
-            SET {', '.join(f'{col} = ?' for col in updates.keys())}
-            WHERE user_id = ?
-            """,
-            (*updates.values(), user_id)
-        )
-        conn.commit()
-
-def get_users_by_city(city_column: str) -> list[int]:
+def get_users_by_city(city_id: int) -> list[int]:
     """
     Retrieve all user IDs subscribed to a specific city.
     
     Args:
-        city_column: Database column name for the city
-                    Valid values: 'tel_aviv', 'beer_sheva', 'jerusalem', 'haifa'
+        city_id: NITE API city identifier (1=חיפה, 2=תל אביב, 3=ירושלים, 5=באר שבע)
     
     Returns:
         List of Telegram user IDs (integers) subscribed to the specified city
         Example: [1152610979, 987654321]
         Returns empty list if no users subscribed
     
+    Raises:
+        ValueError: If city_id is not in config.CITIES
+    
     Usage:
         Used by checker bot to determine which users to notify about new exams.
-        Column name should be obtained from get_city_column(city_id).
+    """
+    return [int(user_id) for user_id in _get_subscribers(_TELEGRAM, city_id)]
+
+def get_users_by_cities(city_ids: Iterable[int]) -> dict[int, list[int]]:
+    """
+    Retrieve Telegram subscribers of several cities with a single query.
+    
+    Args:
+        city_ids: NITE API city identifiers
+    
+    Returns:
+        Dictionary mapping each requested city_id to its Telegram user IDs
+        Example: {2: [1152610979, 987654321], 5: []}
     
-    Security Note:
-        Uses f-string for column name (not user input) - safe from SQL injection
-        as column names are validated through config.py.
+    Raises:
+        ValueError: If any city_id is not in config.CITIES
+    
+    Usage:
+        Used by checker bot when new exams appear in several cities at once.
+    """
+    return {
+        city_id: [int(user_id) for user_id in user_ids]
+        for city_id, user_ids in _get_subscribers_by_cities(_TELEGRAM, city_ids).items()
+    }
+
+def iter_users_by_city(city_id: int, chunk: int = 25):
     """
-    with get_connection() as conn:
-        rows = conn.execute(
-            f"SELECT user_id FROM users WHERE {city_column} = 1"
+    Yield Telegram user IDs subscribed to a city, in batches of up to `chunk`.
+    
+    Args:
+        city_id: NITE API city identifier
+        chunk: Batch size (users per query)
+    
+    Yields:
+        Lists of Telegram user IDs (integers), e.g. [1152610979, 987654321]
+    
+    Raises:
+        ValueError: If city_id is not in config.CITIES
+    
+    Usage:
+        Hand each batch to notifications.send_telegram_broadcast, which
+        already keeps sends under Telegram's ~30 messages/second limit -
+        no extra sleep between batches is needed:
+            for batch in iter_users_by_city(city_id):
+                await send_telegram_broadcast(batch, msg)
+    
+    Note:
+        Each batch is a separate keyset-paginated query (user_id > last seen),
+        so no cursor is left open while the caller processes a batch.
+    """
+    _check_city_id(city_id)
+    last_user_id = ""
+    while True:
+        rows = get_connection().execute(
+            """SELECT user_id FROM subscriptions
+               WHERE platform = ? AND city_id = ? AND user_id > ?
+               ORDER BY user_id LIMIT ?""",
+            (_TELEGRAM, city_id, last_user_id, chunk)
         ).fetchall()
-        return [row[0] for row in rows]
+        if not rows:
+            return
+        last_user_id = rows[-1][0]
+        yield [int(row[0]) for row in rows]
 
 # ----------------------------
 # WhatsApp User Management Functions
@@ -304,81 +649,72 @@ def add_whatsapp_user(user_id: str):
         user_id: WhatsApp user ID (string identifier)
     
     Side Effects:
-        - Inserts new row into 'whatsapp_users' table with all city subscriptions set to 0
+        - Inserts new row into 'whatsapp_users' table (no city subscriptions yet)
         - Uses INSERT OR IGNORE to prevent duplicate key errors
-        - Commits transaction
     
     Note:
         Called when user first sends /start command to the WhatsApp bot.
         If user already exists, operation is silently ignored.
     """
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO whatsapp_users (user_id)
-            VALUES (?)
-            """,
-            (user_id,)
-        )
-        conn.commit()
+    conn = get_connection()
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO whatsapp_users (user_id)
+        VALUES (?)
+        """,
+        (user_id,)
+    )
 
-def update_whatsapp_user_cities(user_id: str, cities: list[str]):
+def update_whatsapp_user_cities(user_id: str, cities: Iterable[str]):
     """
     Update WhatsApp user's city subscription preferences.
     
     Args:
         user_id: WhatsApp user ID (string)
-        cities: List of Hebrew city names user wants to subscribe to
+        cities: Hebrew city names user wants to subscribe to (any iterable)
                 Example: ['תל אביב', 'חיפה']
     
     Side Effects:
-        - Updates all city columns in 'whatsapp_users' table for given user_id
-        - Sets matching cities to 1 (subscribed), others to 0 (unsubscribed)
-        - Commits transaction
+        - Replaces the user's rows in 'subscriptions' (platform 'whatsapp')
+          with one row per selected city, in a single transaction
     
     Implementation:
-        Uses get_city_columns_map() to convert Hebrew names to DB column names.
-        Dynamically builds UPDATE query for all city columns.
+        Uses CITY_IDS_MAP to convert Hebrew names to NITE city IDs.
     """
-    city_columns = get_city_columns_map()
+    _set_subscriptions(_WHATSAPP, user_id, cities)
 
-    # Create dict: {db_column: 1 or 0} based on whether city is in user's selection
-    updates = {column: (1 if city in cities else 0) for city, column in city_columns.items()}
-
-    with get_connection() as conn:
-        conn.execute(
-            f"""
-            UPDATE whatsapp_users
-            SET {', '.join(f'{col} = ?' for col in updates.keys())}
-            WHERE user_id = ?
-            """,
-            (*updates.values(), user_id)
-        )
-        conn.commit()
-
-def get_whatsapp_users_by_city(city_column: str) -> list[str]:
+def get_whatsapp_users_by_city(city_id: int) -> list[str]:
     """
     Retrieve all WhatsApp user IDs subscribed to a specific city.
     
     Args:
-        city_column: Database column name for the city
-                    Valid values: 'tel_aviv', 'beer_sheva', 'jerusalem', 'haifa'
+        city_id: NITE API city identifier
     
     Returns:
         List of WhatsApp user IDs (strings) subscribed to the specified city
         Example: ['whatsapp_user_123', 'whatsapp_user_456']
         Returns empty list if no users subscribed
     
+    Raises:
+        ValueError: If city_id is not in config.CITIES
+    
     Usage:
         Used by checker bot to determine which WhatsApp users to notify about new exams.
-        Column name should be obtained from get_city_column(city_id).
+    """
+    return _get_subscribers(_WHATSAPP, city_id)
+
+def get_whatsapp_users_by_cities(city_ids: Iterable[int]) -> dict[int, list[str]]:
+    """
+    Retrieve WhatsApp subscribers of several cities with a single query.
+    
+    Args:
+        city_ids: NITE API city identifiers
+    
+    Returns:
+        Dictionary mapping each requested city_id to its WhatsApp user IDs
+        Example: {2: ['whatsapp_user_123'], 5: []}
     
-    Security Note:
-        Uses f-string for column name (not user input) - safe from SQL injection
-        as column names are validated through config.py.
+    Raises:
+        ValueError: If any city_id is not in config.CITIES
     """
-    with get_connection() as conn:
-        rows = conn.execute(
-            f"SELECT user_id FROM whatsapp_users WHERE {city_column} = 1"
-        ).fetchall()
-        return [row[0] for row in rows]
\ No newline at end of file
+    return _get_subscribers_by_cities(_WHATSAPP, city_ids)
\ No newline at end of file
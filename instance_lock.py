@@ -0,0 +1,55 @@
+"""
+Single-Instance Locks - Keep One Bot/Checker Per Host
+
+Two client bots on one token compete for getUpdates (Telegram 409 Conflict),
+and two checkers notify every subscriber twice and race on the exams table.
+Each entry point takes an exclusive flock on its lock file before doing any
+work, and exits if another process already holds it.
+
+Usage:
+    main.py        - takes BOT_LOCK_FILE and CHECKER_LOCK_FILE before starting either bot
+    bot.py         - takes BOT_LOCK_FILE (no-op when already held by main.py)
+    nite_check.py  - takes CHECKER_LOCK_FILE when run standalone
+
+Dependencies:
+    - fcntl: flock (POSIX only - locking is skipped on Windows)
+"""
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows - the single-instance lock is skipped
+    fcntl = None
+
+# Lock path -> open lock file, kept for the process lifetime once acquired
+_held_locks = {}
+
+
+def acquire_instance_lock(path: str) -> bool:
+    """
+    Take an exclusive, non-blocking flock on the given lock file.
+
+    Args:
+        path: Lock file path (BOT_LOCK_FILE or CHECKER_LOCK_FILE from config)
+
+    Returns:
+        True if this process holds the lock (or locking is unsupported),
+        False if another process already holds it
+
+    Note:
+        The file object is stored in _held_locks so the lock lives until the
+        process exits; the OS releases it automatically. Calling again for a
+        path this process already holds returns True - flock treats a second
+        open() of the same file as a separate holder, so it must not re-lock.
+    """
+    if fcntl is None or path in _held_locks:
+        return True
+
+    lock_file = open(path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+
+    _held_locks[path] = lock_file
+    return True
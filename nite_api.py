@@ -5,69 +5,162 @@ This module handles all interactions with the NITE (National Institute for Testi
 website and API. It provides a clean interface for fetching exam schedule data.
 
 Responsibilities:
-    - Establishing session with NITE website
-    - Fetching exam data from NITE API
+    - Establishing session with NITE website (once, re-established on auth failure)
+    - Fetching exam data from NITE API (conditional requests, skip unchanged bodies)
     - Handling API errors and timeouts
-    - Parsing API responses
+    - Parsing API responses into (date, city_id) pairs
 
 Dependencies:
-    - requests: HTTP client for API calls
+    - httpx: Async HTTP client for API calls
+    - sys: String interning for exam dates
+    - ssl: TLS context for the API host
+    - hashlib: Response body digests for change detection
+    - orjson: Fast JSON decoding straight from response bytes
     - logging: Error logging
     - config: API endpoints and headers configuration
 """
 
+import sys
+import ssl
+import hashlib
 import logging
-import requests
+import httpx
+import orjson
 from config import (
     NITE_MAIN_URL,
     NITE_API_URL,
     NITE_API_HEADERS,
+    NITE_CA_BUNDLE,
+    NITE_VERIFY_TLS,
     REQUEST_TIMEOUT
 )
 
 logger = logging.getLogger(__name__)
 
+# TLS settings for the API host, decided once at import: verified (default CA
+# store, or the pinned NITE_CA_BUNDLE), unless disabled with NITE_VERIFY_TLS=0.
+# A verified connection also lets the kept-alive client resume TLS sessions.
+if not NITE_VERIFY_TLS:
+    _api_verify = False
+elif NITE_CA_BUNDLE:
+    _api_verify = ssl.create_default_context(cafile=NITE_CA_BUNDLE)
+else:
+    _api_verify = True
 
-def fetch_exam_dates():
+# Shared async client for all NITE requests - connections are kept alive across polls.
+# The API host gets its own transport with _api_verify; the main website always
+# uses normal verification.
+_client = httpx.AsyncClient(
+    timeout=REQUEST_TIMEOUT,
+    follow_redirects=True,
+    mounts={
+        f"https://{httpx.URL(NITE_API_URL).host}": httpx.AsyncHTTPTransport(verify=_api_verify)
+    }
+)
+
+# Statuses meaning the session cookies were rejected and must be re-established
+_AUTH_FAILURES = (401, 403)
+
+# State from the last successful poll, used to skip work when nothing changed
+_last_etag: str | None = None     # ETag header, sent back as If-None-Match
+_last_modified: str | None = None # Last-Modified header, sent back as If-Modified-Since
+_last_hash: bytes | None = None   # blake2b digest of the last response body
+_last_pairs: frozenset[tuple[str, int]] = frozenset()  # Parsed result of that body
+
+
+async def _get_api(headers: dict) -> httpx.Response:
     """
-    Fetch current exam schedule from NITE API.
+    GET the API endpoint, establishing session cookies first when needed.
+    
+    Args:
+        headers: Request headers for the API call
     
     Returns:
-        Dictionary mapping exam dates to lists of city IDs.
-        Example: {
-            '2025-11-04': [3],  # Jerusalem
-            '2025-11-05': [2, 5]  # Tel Aviv and Beer Sheva
-        }
-        Returns empty dict {} on failure.
+        The API response (status not checked)
+    
+    Note:
+        The main website is only visited when the client has no cookies yet,
+        or once more when the API rejects the current ones (401/403).
+    """
+    if not _client.cookies:
+        await _client.get(NITE_MAIN_URL)
+    resp = await _client.get(NITE_API_URL, headers=headers)
+    if resp.status_code in _AUTH_FAILURES:
+        # Session expired - start a fresh one and retry once
+        _client.cookies.clear()
+        await _client.get(NITE_MAIN_URL)
+        resp = await _client.get(NITE_API_URL, headers=headers)
+    return resp
+
+
+async def fetch_exam_pairs() -> frozenset[tuple[str, int]]:
+    """
+    Fetch current exam schedule from NITE API as (date, city_id) pairs.
+    
+    Returns:
+        Frozenset of (exam_date, city_id) tuples.
+        Example: frozenset({
+            ('2025-11-04', 3),  # Jerusalem
+            ('2025-11-05', 2),  # Tel Aviv
+            ('2025-11-05', 5)   # Beer Sheva
+        })
+        Returns empty frozenset on failure.
+        When the payload is unchanged (304 or identical body) the very same
+        frozenset object as the previous call is returned, so callers can
+        detect "unchanged" with an identity check.
     
     API Flow:
-        1. GET main website to establish session cookies
-        2. GET API endpoint with proper headers
-        3. Parse JSON response
+        1. GET main website to establish session cookies (only if none are held,
+           or the API answered 401/403)
+        2. GET API endpoint with proper headers (+ If-None-Match / If-Modified-Since
+           when the last response had an ETag / Last-Modified)
+        3. On 304 Not Modified - return the previous pairs, nothing to parse
+        4. On 200 - hash the body; parse JSON only if the digest changed
+    
+    API Response Format:
+        {'2025-11-04': [3], '2025-11-05': [2, 5]} - date -> list of city IDs
     
     Error Handling:
-        Catches RequestException and returns empty dict.
+        Catches httpx.HTTPError, invalid JSON and malformed payloads,
+        returns empty frozenset.
         Logs errors but allows caller to continue.
     
     Note:
-        Uses verify=False to bypass SSL verification issues.
+        Coroutine - await it from the checker's event loop.
+        The API host's certificate is verified (see NITE_CA_BUNDLE and
+        NITE_VERIFY_TLS in config for broken certificate chains).
         API requires specific headers to avoid rejection.
     """
-    session = requests.Session()
+    global _last_etag, _last_modified, _last_hash, _last_pairs
     try:
-        # Visit main site first to get session cookies
-        session.get(NITE_MAIN_URL, timeout=REQUEST_TIMEOUT)
-        
-        # Fetch exam data with proper headers
-        resp = session.get(
-            NITE_API_URL,
-            headers=NITE_API_HEADERS,
-            timeout=REQUEST_TIMEOUT,
-            verify=False
-        )
+        # Fetch exam data with proper headers, conditional on the last validators
+        headers = NITE_API_HEADERS
+        if _last_etag or _last_modified:
+            headers = dict(NITE_API_HEADERS)
+            if _last_etag:
+                headers["If-None-Match"] = _last_etag
+            if _last_modified:
+                headers["If-Modified-Since"] = _last_modified
+        resp = await _get_api(headers)
+        if resp.status_code == 304:
+            return _last_pairs
         resp.raise_for_status()
-        return resp.json()
-    except requests.RequestException as e:
-        logger.error(f"Failed to fetch exam dates from NITE API: {e}")
-        return {}
 
+        # Identical body to last poll - reuse the parsed pairs
+        digest = hashlib.blake2b(resp.content, digest_size=16).digest()
+        if digest != _last_hash:
+            data = orjson.loads(resp.content)
+            # Interned dates are shared across polls and with the checker's state,
+            # so comparing pairs usually hits the identity fast path
+            _last_pairs = frozenset(
+                (sys.intern(date), city_id)
+                for date, cities in data.items() for city_id in cities
+            )
+            _last_hash = digest
+        _last_etag = resp.headers.get("ETag")
+        _last_modified = resp.headers.get("Last-Modified")
+        return _last_pairs
+    # ValueError: invalid JSON (orjson.JSONDecodeError); AttributeError/TypeError: unexpected payload shape
+    except (httpx.HTTPError, ValueError, AttributeError, TypeError) as e:
+        logger.error(f"Failed to fetch exam dates from NITE API: {e}")
+        return frozenset()
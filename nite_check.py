@@ -6,7 +6,7 @@ API for exam schedule changes and sends real-time notifications to subscribed us
 via multiple platforms (Telegram, WhatsApp).
 
 Architecture:
-    1. Fetch exam data from NITE API every 2-4 minutes
+    1. Fetch exam data from NITE API every 1-10 minutes (adaptive, see below)
     2. Compare with current database state
     3. Detect new exams (additions) and removed exams (cancellations)
     4. Send notifications to users subscribed to affected cities (Telegram and WhatsApp)
@@ -14,42 +14,58 @@ Architecture:
     6. Log all changes to exam_log table
 
 Monitoring Loop:
-    - Runs indefinitely with random delays (120-240 seconds)
-    - Handles API failures gracefully (continues on next iteration)
+    - Runs indefinitely with random delays: 60-120 seconds right after the
+      schedule changes, otherwise 120-240 seconds, with the upper bound growing
+      by 30 seconds per unchanged check up to 600
+    - Handles API failures gracefully (retries with exponential backoff)
     - Logs all operations and errors
 
 Dependencies:
-    - time, random: Sleep interval management
+    - asyncio, random: Non-blocking sleep, concurrent notification fan-out
+    - threading: Optional stop event when run from main.py
+    - collections: Grouping new exams by city
     - logging: Operation logging
+    - instance_lock: Single-instance lock for standalone runs
     - db: Database operations
     - config: Centralized configuration
-    - nite_api: NITE API client for fetching exam data
+    - nite_api: NITE API client for fetching exam (date, city_id) pairs
     - notifications: Notification service (Telegram and WhatsApp)
 
 Usage:
-    python3 nite_check.py  # Run standalone
+    python3 nite_check.py  # Run standalone (asyncio.run(run_checker()))
     python3 main.py        # Run with telegram bot (recommended)
 """
 
-import time
+import asyncio
 import random
 import logging
+import threading
+from collections import defaultdict
 from database.db import (
     init_db,
     get_current_exams,
-    add_exam,
-    remove_exam,
-    get_users_by_city,
-    get_whatsapp_users_by_city
+    add_exams,
+    remove_exams,
+    get_users_by_cities,
+    get_whatsapp_users_by_cities
 )
 from config import (
+    CITY_NAMES,
     get_city_name,
-    get_city_column,
     CHECK_INTERVAL_MIN,
-    CHECK_INTERVAL_MAX
+    CHECK_INTERVAL_MAX,
+    CHECK_INTERVAL_ACTIVE_MIN,
+    CHECK_INTERVAL_ACTIVE_MAX,
+    CHECK_INTERVAL_QUIET_STEP,
+    CHECK_INTERVAL_QUIET_MAX,
+    CHECK_BACKOFF_BASE,
+    CHECK_BACKOFF_MAX,
+    CHECK_RECONCILE_EVERY,
+    CHECKER_LOCK_FILE
 )
-from nite_api import fetch_exam_dates
-from notifications import send_telegram_message, send_whatsapp_message
+from instance_lock import acquire_instance_lock
+from nite_api import fetch_exam_pairs
+from notifications import send_telegram_broadcast, send_whatsapp_message
 
 # Configure logging for monitoring operations
 logging.basicConfig(
@@ -62,121 +78,205 @@ logger = logging.getLogger(__name__)
 # Main Checker Logic
 # ----------------
 
-def run_checker():
+async def run_checker(stop_event: threading.Event | None = None):
     """
     Main monitoring loop - continuously check for exam changes and notify users.
     
+    Coroutine - run with asyncio.run(run_checker()).
+    
+    Args:
+        stop_event: Optional event that ends the loop when set (used by main.py,
+                    which runs the checker in a thread). Without it the loop
+                    runs forever.
+    
     Flow:
         1. Initialize database (create tables if needed)
-        2. Enter infinite loop:
+        2. Loop until stop_event is set (forever without one):
            a. Fetch current exam data from API
-           b. Compare with database state
+           b. Compare with the in-memory copy of the database state
            c. Detect new exams (API has, DB doesn't)
            d. Detect removed exams (DB has, API doesn't)
-           e. For new exams: notify subscribed users, update DB
-           f. For removed exams: remove from DB (no notifications currently)
-           g. Sleep random interval (120-240 seconds)
+           e. For new exams: notify subscribed users, then add them to DB in one batch
+           f. For removed exams: remove from DB in one batch (no notifications currently)
+           g. Sleep random interval (shorter after a change, longer while quiet),
+              or back off after a failed fetch
            h. Repeat
     
     New Exam Handling:
-        - Get city name and DB column from config
-        - Query Telegram and WhatsApp users subscribed to that city
-        - Send notifications to each relevant user (Telegram and WhatsApp)
-        - Add exam to database and log creation event
+        - Get city name from config.CITY_NAMES (unknown city IDs are skipped)
+        - Read Telegram and WhatsApp subscribers of all affected cities (bulk queries)
+        - Send notifications to all relevant users concurrently (Telegram and WhatsApp)
+        - Collect notified exams and add them to database with a single add_exams call
     
     Removed Exam Handling:
-        - Remove from database
-        - Log deletion event
+        - Remove all from database with a single remove_exams call
+        - Log deletion events
         - Note: Does NOT notify users (potential enhancement)
     
     Error Resilience:
-        - API failures return empty dict, logged but don't crash bot
+        - API failures return an empty set, logged but don't crash bot
+        - Consecutive API failures retry with exponential backoff
+          (CHECK_BACKOFF_BASE doubling up to CHECK_BACKOFF_MAX seconds)
         - Message send failures logged but don't stop processing
         - Loop continues indefinitely even after errors
     
     Performance:
+        - Current exam state is kept in memory (this process owns all writes), so a
+          check does not read the exams table; it is reloaded every
+          CHECK_RECONCILE_EVERY checks to pick up out-of-band changes
+        - HTTP calls are async: per-user sends for a city overlap via asyncio.gather
+          instead of paying one round-trip per user in sequence
+        - New exams are grouped by city: subscribers of all affected cities are read
+          with one query per platform and each user gets one message listing all
+          new dates
         - Randomized sleep prevents predictable API polling patterns
-        - Set comparison (O(n)) for efficient change detection
     
     Note:
-        This function blocks indefinitely. Use Ctrl+C or process termination to stop.
+        Without stop_event this coroutine never returns. Use Ctrl+C or process
+        termination to stop.
     """
     # Initialize the database tables if they do not exist
     init_db()
 
     logger.info("Bot initialized and connected to SQLite database.")
 
-    while True:
-        api_data = fetch_exam_dates()
-        if not api_data:
+    existing_pairs = get_current_exams()
+    # Last API result, and whether existing_pairs fully reflects it
+    last_pairs = None
+    in_sync = False
+    checks_since_reload = 0
+    failures = 0
+    # Consecutive successful checks with an unchanged payload
+    quiet_streak = 0
+    while stop_event is None or not stop_event.is_set():
+        # Set of (date, city_id) tuples - parsed (and cached when unchanged) by nite_api
+        current_pairs = await fetch_exam_pairs()
+        if not current_pairs:
+            failures += 1
             logger.warning("No data retrieved from the API.")
         else:
-            # Parse API data into a set of tuples (date, city_id)
-            current_pairs = set()
-            for date, cities in api_data.items():
-                for city_id in cities:
-                    current_pairs.add((date, city_id))
+            failures = 0
+            # Periodically resync with the database in case it was edited by hand
+            checks_since_reload += 1
+            if checks_since_reload >= CHECK_RECONCILE_EVERY:
+                existing_pairs = get_current_exams()
+                checks_since_reload = 0
+                in_sync = False
 
-            # Retrieve the current state of exams from the database
-            existing_pairs = get_current_exams()
-
-            # Identify new and removed exams
-            new_exams = current_pairs - existing_pairs
-            removed_exams = existing_pairs - current_pairs
+            # Identify new and removed exams. Usually nothing changed: nite_api hands
+            # back the very same frozenset for an unchanged payload, so if the last
+            # result was fully applied there is nothing to compare. Otherwise set
+            # equality (length check first) is cheaper than two empty differences
+            if (current_pairs is last_pairs and in_sync) or current_pairs == existing_pairs:
+                new_exams = removed_exams = frozenset()
+            else:
+                new_exams = current_pairs - existing_pairs
+                removed_exams = existing_pairs - current_pairs
 
             # Handle newly added exams
             if new_exams:
                 logger.info(f"Detected {len(new_exams)} new exams.")
-                for date, city_id in sorted(list(new_exams)):
-                    city_name = get_city_name(city_id)
-                    city_column = get_city_column(city_id)
+                # Group new dates by city so each subscriber gets one message per city
+                dates_by_city = defaultdict(list)
+                for date, city_id in new_exams:
+                    dates_by_city[city_id].append(date)
+
+                # Subscribers of all affected (known) cities, one query per platform
+                known_cities = [city_id for city_id in dates_by_city if city_id in CITY_NAMES]
+                telegram_users = get_users_by_cities(known_cities)
+                whatsapp_users = get_whatsapp_users_by_cities(known_cities)
 
-                    if not city_column:
-                        logger.warning(f"City column not found for city: {city_name}")
+                notified_exams = []
+                for city_id, dates in dates_by_city.items():
+                    # One lookup for both the known-city check and the name
+                    city_name = CITY_NAMES.get(city_id)
+                    if city_name is None:
+                        logger.warning(f"Unknown city id in API data: {get_city_name(city_id)}")
                         continue
 
-                    # Get users subscribed to this city (Telegram)
-                    telegram_user_ids = get_users_by_city(city_column)
-                    
-                    # Get WhatsApp users subscribed to this city
-                    whatsapp_user_ids = get_whatsapp_users_by_city(city_column)
+                    # Users subscribed to this city (Telegram and WhatsApp)
+                    telegram_user_ids = telegram_users[city_id]
+                    whatsapp_user_ids = whatsapp_users[city_id]
                     
                     if not telegram_user_ids and not whatsapp_user_ids:
                         logger.info(f"No users subscribed to city: {city_name}")
                         continue
 
-                    # Send notifications to Telegram users
-                    msg = f"📢 מבחן חדש ב-{city_name}, בתאריך {date}"
-                    for user_id in telegram_user_ids:
-                        send_telegram_message(user_id, msg)
-                    
-                    # Send notifications to WhatsApp users
-                    for user_id in whatsapp_user_ids:
-                        send_whatsapp_message(user_id, msg)
+                    dates.sort()
+                    if len(dates) == 1:
+                        msg = f"📢 מבחן חדש ב-{city_name}, בתאריך {dates[0]}"
+                    else:
+                        msg = f"📢 מבחנים חדשים ב-{city_name}:\n" + "\n".join(dates)
+
+                    # Send notifications to Telegram and WhatsApp users concurrently;
+                    # return_exceptions keeps one failed send from aborting the rest
+                    delivered, *_ = await asyncio.gather(
+                        send_telegram_broadcast(telegram_user_ids, msg),
+                        *(send_whatsapp_message(user_id, msg) for user_id in whatsapp_user_ids),
+                        return_exceptions=True
+                    )
+                    if isinstance(delivered, int):
+                        logger.info(
+                            f"Notified {delivered}/{len(telegram_user_ids)} Telegram users "
+                            f"about {city_name}."
+                        )
 
-                    # Add the exam to the database
-                    add_exam(date, city_id)
+                    notified_exams.extend((date, city_id) for date in dates)
+
+                # Add the notified exams to the database in one transaction
+                add_exams(notified_exams)
+                existing_pairs.update(notified_exams)
             
             # Handle removed exams (cancelled/deleted from NITE system)
             if removed_exams:
                 logger.info(f"Detected {len(removed_exams)} removed exams.")
-                for date, city_id in removed_exams:
-                    # Remove from DB and log deletion event
-                    # Note: Currently does NOT notify users about cancellations
-                    remove_exam(date, city_id)
+                # Remove from DB and log deletion events in one transaction
+                # Note: Currently does NOT notify users about cancellations
+                remove_exams(list(removed_exams))
+                existing_pairs -= removed_exams
+
+            # Judge activity by the payload itself: an unrecorded exam (no
+            # subscribers yet) shows up as "new" every check but isn't news
+            quiet_streak = quiet_streak + 1 if current_pairs is last_pairs else 0
+
+            # New exams nobody was subscribed to stay unrecorded, and must be
+            # diffed again next time even if the payload doesn't change
+            last_pairs = current_pairs
+            in_sync = not new_exams or existing_pairs == current_pairs
 
             # Log when no changes detected (helps confirm bot is running)
             if not new_exams and not removed_exams:
                 logger.info("No changes in the exam schedule.")
 
-        # Wait random interval before next check to avoid predictable patterns
-        wait_time = random.randint(CHECK_INTERVAL_MIN, CHECK_INTERVAL_MAX)
+        if failures:
+            # Retry sooner after a transient failure, backing off while it persists
+            wait_time = min(CHECK_BACKOFF_MAX, CHECK_BACKOFF_BASE * 2 ** (failures - 1))
+        elif quiet_streak == 0:
+            # The schedule just changed - more changes often follow, check again soon
+            wait_time = random.randint(CHECK_INTERVAL_ACTIVE_MIN, CHECK_INTERVAL_ACTIVE_MAX)
+        else:
+            # Wait random interval before next check to avoid predictable patterns;
+            # the longer nothing changes, the longer the interval may get
+            wait_time = random.randint(CHECK_INTERVAL_MIN, min(
+                CHECK_INTERVAL_QUIET_MAX,
+                CHECK_INTERVAL_MAX + (quiet_streak - 1) * CHECK_INTERVAL_QUIET_STEP
+            ))
         logger.info(f"Sleeping for {wait_time} seconds before the next check...")
-        time.sleep(wait_time)
+        if stop_event is None:
+            await asyncio.sleep(wait_time)
+        else:
+            # Wait on the event in a worker thread so setting it ends the sleep at once
+            await asyncio.to_thread(stop_event.wait, wait_time)
+
+    logger.info("Checker stopped.")
 
 # ----------------
 # Entry Point
 # ----------------
 
 if __name__ == "__main__":
-    run_checker()
\ No newline at end of file
+    # main.py takes this lock itself; standalone runs must not double up either
+    if not acquire_instance_lock(CHECKER_LOCK_FILE):
+        logger.error("Another checker instance is already running. Exiting.")
+        raise SystemExit(0)
+    asyncio.run(run_checker())
\ No newline at end of file
@@ -5,38 +5,173 @@ This module handles sending messages to users via different platforms.
 It provides a clean interface for notification delivery.
 
 Responsibilities:
-    - Sending Telegram messages via Bot API
+    - Sending Telegram messages via Bot API (single user or broadcast)
     - Sending WhatsApp messages (placeholder for future implementation)
     - Error handling for failed message deliveries
     - Logging notification attempts
 
 Dependencies:
-    - requests: HTTP client for API calls
+    - httpx (with the http2 extra): Async HTTP client for API calls
+    - asyncio, time: Waiting between retries, send rate limiting
+    - urllib.parse: Form-encoding message bodies
     - logging: Operation logging
-    - os: Environment variable access
+    - config: Telegram bot token (loaded from the environment / .env)
 """
 
-import os
+import time
+import asyncio
 import logging
-import requests
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from collections.abc import Iterable
+from urllib.parse import quote_plus
+import httpx
+from config import TELEGRAM_TOKEN
 
 logger = logging.getLogger(__name__)
 
-# Telegram bot token for sending notifications
-# Must be set in .env file as TELEGRAM_TOKEN
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-
+# Telegram bot token for sending notifications (loaded by config from .env)
 if not TELEGRAM_TOKEN:
     raise ValueError("Missing TELEGRAM_TOKEN environment variable")
 
+# Bot API endpoint - built once instead of per message
+_SEND_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+
+# Shared async client for outgoing messages - keeps connections alive.
+# HTTP/2 multiplexes a whole notification fan-out over one TCP+TLS connection
+# (falling back to at most 20 HTTP/1.1 connections if not negotiated). The
+# transport retries failed connection attempts (never a request that reached
+# Telegram, so a message can't be delivered twice). Pool settings live on the
+# transport - the client ignores its own when a transport is given.
+# sendMessage bodies are form-encoded by hand (see _encode_text)
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+_client = httpx.AsyncClient(
+    timeout=10,
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=20)
+    )
+)
+
+# Bot API responses worth retrying: flood limit (429) and transient server errors
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_ATTEMPTS = 3      # Total tries per message
+_RETRY_BACKOFF = 0.3   # Seconds before the first retry, doubled per attempt
+
+# Telegram allows about 30 messages per second per bot across all chats
+_SEND_INTERVAL = 1 / 30
+# Earliest monotonic time the next send may start (see _throttle)
+_next_send_at = 0.0
+# Monotonic time until which no send may start, after a 429 (see _pause_sends)
+_paused_until = 0.0
+
+
+async def _throttle():
+    """
+    Wait for this send's slot so the bot stays under Telegram's global limit.
+    
+    Note:
+        Each caller reserves the next free slot, _SEND_INTERVAL apart, before
+        awaiting - no await between reading and updating _next_send_at, so
+        concurrent sends on the event loop never share a slot.
+        A caller whose slot comes up during a 429 pause reserves a new one
+        after the pause, so queued sends resume at the normal rate.
+    """
+    global _next_send_at
+    while True:
+        now = time.monotonic()
+        slot = max(now, _next_send_at)
+        _next_send_at = slot + _SEND_INTERVAL
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        if time.monotonic() >= _paused_until:
+            return
+
+
+def _pause_sends(delay: float):
+    """
+    Hold every send for delay seconds after Telegram returns 429.
+    
+    Note:
+        The flood limit applies to the whole bot, not one chat - a broadcast
+        that kept firing would only collect more 429s and burn its retries.
+    """
+    global _next_send_at, _paused_until
+    _paused_until = max(_paused_until, time.monotonic() + delay)
+    _next_send_at = max(_next_send_at, _paused_until)
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a failed send.
+    
+    Args:
+        resp: The retryable response
+        attempt: Zero-based number of the attempt that failed
+    
+    Returns:
+        Telegram's retry_after for a 429 (from the JSON body, else the
+        Retry-After header), otherwise exponential backoff.
+    """
+    if resp.status_code == 429:
+        try:
+            return float(resp.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            header = resp.headers.get("Retry-After", "")
+            if header.isdigit():
+                return float(header)
+    return _RETRY_BACKOFF * 2 ** attempt
+
 
-def send_telegram_message(user_id: int, text: str) -> bool:
+def _encode_text(text: str) -> bytes:
     """
-    Send a Telegram message to a specific user.
+    Form-encode the text field of a sendMessage body, e.g. b'&text=%F0%9F%93%A2...'.
+    
+    Note:
+        Done once per message - a broadcast reuses the result for every user,
+        instead of UTF-8 and percent-encoding the same Hebrew text per send.
+    """
+    return b"&text=" + quote_plus(text).encode("ascii")
+
+
+async def _post_message(user_id: int, text_field: bytes) -> bool:
+    """
+    POST one sendMessage request, with throttling and retries.
+    
+    Args:
+        user_id: Telegram user ID (chat_id)
+        text_field: Encoded text field from _encode_text
+    
+    Returns:
+        True if message sent successfully, False otherwise
+    """
+    body = b"chat_id=" + quote_plus(str(user_id)).encode("ascii") + text_field
+    for attempt in range(_MAX_ATTEMPTS):
+        try:
+            await _throttle()
+            resp = await _client.post(_SEND_URL, content=body, headers=_FORM_HEADERS)
+            if resp.status_code in _RETRY_STATUSES and attempt < _MAX_ATTEMPTS - 1:
+                delay = _retry_delay(resp, attempt)
+                logger.warning(
+                    f"Telegram returned {resp.status_code} for user {user_id}, "
+                    f"retrying in {delay} seconds."
+                )
+                if resp.status_code == 429:
+                    _pause_sends(delay)  # This send waits out the pause in _throttle
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            resp.raise_for_status()
+            logger.info(f"Message successfully sent to user {user_id}.")
+            return True
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to send message to user {user_id}: {e}")
+            return False
+
+
+async def send_telegram_message(user_id: int, text: str) -> bool:
+    """
+    Send a Telegram message to a specific user (coroutine).
     
     Args:
         user_id: Telegram user ID (chat_id)
@@ -50,28 +185,48 @@ def send_telegram_message(user_id: int, text: str) -> bool:
         - Logs success or failure
     
     Error Handling:
-        Catches and logs RequestException but does not raise.
+        429 and 5xx responses are retried (up to _MAX_ATTEMPTS tries), waiting
+        Telegram's retry_after or an exponential backoff in between. A 429
+        pauses all sends, not just this one, for retry_after.
+        Catches and logs httpx.HTTPError but does not raise.
         Failed messages do not stop the bot from continuing.
     
     Note:
-        Uses global TELEGRAM_TOKEN for authentication.
-        10-second timeout to prevent hanging.
+        Rate limited to 30 messages/second (_throttle), so a large fan-out
+        can run fully concurrent without hitting Telegram's flood limit.
+        Posts to the prebuilt _SEND_URL (global TELEGRAM_TOKEN) over the shared
+        keep-alive client. 10-second timeout to prevent hanging.
+    """
+    return await _post_message(user_id, _encode_text(text))
+
+
+async def send_telegram_broadcast(user_ids: Iterable[int], text: str) -> int:
+    """
+    Send the same Telegram message to many users concurrently (coroutine).
+    
+    Args:
+        user_ids: Telegram user IDs (chat_ids)
+        text: Message content in Hebrew
+    
+    Returns:
+        Number of users the message was delivered to
+    
+    Note:
+        All sends run concurrently on the shared client; _throttle keeps them
+        under Telegram's rate limit. One failed send never aborts the others.
+        The text is form-encoded once and shared by every request body.
     """
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": user_id, "text": text}
-    try:
-        resp = requests.post(url, data=payload, timeout=10)
-        resp.raise_for_status()
-        logger.info(f"Message successfully sent to user {user_id}.")
-        return True
-    except requests.RequestException as e:
-        logger.error(f"Failed to send message to user {user_id}: {e}")
-        return False
+    text_field = _encode_text(text)
+    results = await asyncio.gather(
+        *(_post_message(user_id, text_field) for user_id in user_ids),
+        return_exceptions=True
+    )
+    return sum(result is True for result in results)
 
 
-def send_whatsapp_message(user_id: str, text: str) -> bool:
+async def send_whatsapp_message(user_id: str, text: str) -> bool:
     """
-    Send a WhatsApp message to a specific user.
+    Send a WhatsApp message to a specific user (coroutine).
     
     Args:
         user_id: WhatsApp user ID (string identifier)
@@ -85,7 +240,7 @@ def send_whatsapp_message(user_id: str, text: str) -> bool:
         - Logs success or failure
     
     Error Handling:
-        Catches and logs RequestException but does not raise.
+        Catches and logs httpx.HTTPError but does not raise.
         Failed messages do not stop the bot from continuing.
     
     Note:
@@ -105,11 +260,11 @@ def send_whatsapp_message(user_id: str, text: str) -> bool:
     # headers = {"Authorization": f"Bearer {WHATSAPP_API_TOKEN}"}
     # payload = {"to": user_id, "text": text}
     # try:
-    #     resp = requests.post(url, json=payload, headers=headers, timeout=10)
+    #     resp = await _client.post(url, json=payload, headers=headers)
     #     resp.raise_for_status()
     #     logger.info(f"WhatsApp message successfully sent to user {user_id}.")
     #     return True
-    # except requests.RequestException as e:
+    # except httpx.HTTPError as e:
     #     logger.error(f"Failed to send WhatsApp message to user {user_id}: {e}")
     #     return False
     
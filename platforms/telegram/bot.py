@@ -20,15 +20,17 @@ Commands:
 Dependencies:
     - python-telegram-bot: Telegram Bot API wrapper
     - db: Database operations for user management
-    - config: Centralized city configuration
+    - config: Centralized city configuration and bot token
 """
 
-import os
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
-    Application, CommandHandler, ConversationHandler, CallbackQueryHandler, ContextTypes
+    Application, BaseUpdateProcessor, CommandHandler, ConversationHandler,
+    CallbackQueryHandler, ContextTypes
 )
+from telegram.request import HTTPXRequest
 
 # Import from parent directory (project root)
 import sys
@@ -40,13 +42,13 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 from database.db import init_db, add_user, update_user_cities
-from config import get_city_options
+from config import get_city_options, TELEGRAM_TOKEN, BOT_POLLING_TIMEOUT, BOT_LOCK_FILE
+from instance_lock import acquire_instance_lock
 
 
 # ========== CONFIGURATION ==========
 
-# Load Telegram bot token from environment variable
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+# Telegram bot token, loaded by config from the environment / .env
 if not TELEGRAM_TOKEN:
     raise ValueError("Missing TELEGRAM_TOKEN environment variable")
 
@@ -56,6 +58,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Updates processed at once across different chats (one chat is always sequential)
+MAX_CONCURRENT_UPDATES = 64
+
 # Conversation handler states for managing user flow
 START, CHOOSING_CITIES = range(2)
 
@@ -63,6 +68,23 @@ START, CHOOSING_CITIES = range(2)
 # Example: ['תל אביב', 'באר שבע', 'ירושלים', 'חיפה']
 CITY_OPTIONS = get_city_options()
 
+# City selections are stored per user as an int bitmask:
+# bit i is set when CITY_OPTIONS[i] is selected.
+# Callback data "city_<i>" -> bit index i, e.g. {'city_0': 0, 'city_1': 1, ...}
+_CITY_CALLBACKS = {f"city_{i}": i for i in range(len(CITY_OPTIONS))}
+
+# Button objects shared across all keyboards, one per city and state (indexed like CITY_OPTIONS)
+_BTN_OFF = [InlineKeyboardButton(c, callback_data=f"city_{i}") for i, c in enumerate(CITY_OPTIONS)]
+_BTN_ON = [InlineKeyboardButton(f"✅ {c}", callback_data=f"city_{i}") for i, c in enumerate(CITY_OPTIONS)]
+
+# Confirmation button shown under the city buttons, shared by every keyboard
+_CONTINUE_BTN = InlineKeyboardButton("המשך", callback_data="continue")
+
+# Built keyboards keyed by selection bitmask.
+# With N cities there are only 2^N possible selections, so every state is cached
+# and a toggle becomes a dict lookup instead of rebuilding all buttons.
+_KEYBOARD_CACHE: dict[int, InlineKeyboardMarkup] = {}
+
 
 # ========== HANDLERS ==========
 
@@ -79,22 +101,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     
     Side Effects:
         - Registers user in database (if not already registered)
-        - Initializes empty city selection set in user session
-        - Sends welcome message and city selection keyboard to user
+        - Initializes empty city selection bitmask in user session
+        - Sends one message with welcome text and city selection keyboard
     """
     user = update.effective_user
     user_id = user.id
 
     # Register user in database (INSERT OR IGNORE if exists)
-    add_user(user_id)
+    # Run in a worker thread so blocking SQLite I/O doesn't stall other users' updates
+    await asyncio.to_thread(add_user, user_id)
     
     # Initialize user session data for tracking city selections
-    context.user_data['selected_cities'] = set()
+    context.user_data['selected_mask'] = 0
 
-    # Send welcome messages and city selection interface
-    await update.message.reply_text("ברוך הבא לבוט שלי 👋")
+    # Send welcome text and city selection interface as a single message
     await update.message.reply_text(
-        "בחר ערים שעליהן תרצה לקבל התראות:",
+        "ברוך הבא לבוט שלי 👋\nבחר ערים שעליהן תרצה לקבל התראות:",
         reply_markup=_build_city_keyboard()
     )
 
@@ -113,7 +135,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         CHOOSING_CITIES to continue selection, or END to complete conversation
     
     Callback Data Formats:
-        - "city_<city_name>": Toggle city subscription (e.g., "city_תל אביב")
+        - "city_<index>": Toggle city at CITY_OPTIONS[index] (e.g., "city_0")
         - "continue": Confirm and save selections
     
     Behavior:
@@ -125,22 +147,25 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()  # Acknowledge button press to remove loading state
 
     data = query.data
-    selected_cities = context.user_data.setdefault('selected_cities', set())
+    selected_mask = context.user_data.get('selected_mask', 0)
 
-    if data.startswith("city_"):
-        # Extract city name from callback data and toggle its selection
-        _toggle_city(data[5:], selected_cities)
+    if data in _CITY_CALLBACKS:
+        # Toggle the city's bit in the user's selection
+        selected_mask = _toggle_city(_CITY_CALLBACKS[data], selected_mask)
+        context.user_data['selected_mask'] = selected_mask
         # Update keyboard to reflect new selection state (add/remove checkmark)
-        await query.edit_message_reply_markup(reply_markup=_build_city_keyboard(selected_cities))
+        await query.edit_message_reply_markup(reply_markup=_build_city_keyboard(selected_mask))
 
     elif data == "continue":
         # Validate that at least one city is selected
-        if not selected_cities:
+        if not selected_mask:
             await query.edit_message_text("לא נבחרו ערים. אנא בחר לפחות עיר אחת.")
             return CHOOSING_CITIES
 
-        # Save user preferences to database
-        update_user_cities(update.effective_user.id, list(selected_cities))
+        selected_cities = _decode_cities(selected_mask)
+
+        # Save user preferences to database (in a worker thread, off the event loop)
+        await asyncio.to_thread(update_user_cities, update.effective_user.id, selected_cities)
         
         # Show confirmation message and end conversation
         await query.edit_message_text(
@@ -171,13 +196,13 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 # ========== HELPERS ==========
 
-def _build_city_keyboard(selected_cities: set[str] | None = None) -> InlineKeyboardMarkup:
+def _build_city_keyboard(selected_mask: int = 0) -> InlineKeyboardMarkup:
     """
     Build interactive inline keyboard with city selection buttons.
     
     Args:
-        selected_cities: Set of currently selected city names (Hebrew)
-                        If None, creates keyboard with no selections
+        selected_mask: Bitmask of selected cities (bit i = CITY_OPTIONS[i])
+                       Defaults to 0 - keyboard with no selections
     
     Returns:
         InlineKeyboardMarkup with:
@@ -187,41 +212,116 @@ def _build_city_keyboard(selected_cities: set[str] | None = None) -> InlineKeybo
     Button Layout:
         Each city button has:
             - Text: "✅ city_name" if selected, else "city_name"
-            - Callback data: "city_<city_name>" for toggling
+            - Callback data: "city_<index>" for toggling
         
         Continue button has:
             - Text: "המשך"
             - Callback data: "continue"
+    
+    Caching:
+        Markups are immutable, so each selection state is built once and
+        served from _KEYBOARD_CACHE on subsequent calls.
     """
-    selected_cities = selected_cities or set()
+    cached = _KEYBOARD_CACHE.get(selected_mask)
+    if cached is not None:
+        return cached
 
-    # Create one button per city, adding checkmark if selected
-    keyboard = [
-        [InlineKeyboardButton(f"{'✅ ' if c in selected_cities else ''}{c}", callback_data=f"city_{c}")]
-        for c in CITY_OPTIONS
-    ]
-    
-    # Add confirmation button at bottom
-    keyboard.append([InlineKeyboardButton("המשך", callback_data="continue")])
+    # One shared button per city (checkmarked variant if its bit is set),
+    # then the confirmation button at bottom - built as a single list
+    markup = InlineKeyboardMarkup([
+        *([(_BTN_ON if selected_mask >> i & 1 else _BTN_OFF)[i]] for i in range(len(CITY_OPTIONS))),
+        [_CONTINUE_BTN],
+    ])
+    _KEYBOARD_CACHE[selected_mask] = markup
+    return markup
 
-    return InlineKeyboardMarkup(keyboard)
+
+def _toggle_city(index: int, selected_mask: int) -> int:
+    """
+    Toggle city selection (select if unselected, unselect if selected).
+    
+    Args:
+        index: Position of the city in CITY_OPTIONS
+        selected_mask: Current selection bitmask
+    
+    Returns:
+        New selection bitmask with the city's bit flipped
+    """
+    return selected_mask ^ (1 << index)
 
 
-def _toggle_city(city: str, selected_cities: set[str]) -> None:
+def _decode_cities(selected_mask: int) -> list[str]:
     """
-    Toggle city in selection set (add if absent, remove if present).
+    Convert a selection bitmask to Hebrew city names.
     
     Args:
-        city: Hebrew city name to toggle
-        selected_cities: Mutable set to modify in-place
+        selected_mask: Selection bitmask (bit i = CITY_OPTIONS[i])
     
-    Side Effects:
-        Modifies selected_cities set directly (in-place operation)
+    Returns:
+        Selected city names in display order
+        Example: 0b0101 -> ['תל אביב', 'ירושלים']
     """
-    if city in selected_cities:
-        selected_cities.remove(city)
-    else:
-        selected_cities.add(city)
+    return [c for i, c in enumerate(CITY_OPTIONS) if selected_mask >> i & 1]
+
+
+# Pre-build the keyboard for every possible selection at import time
+for _mask in range(1 << len(CITY_OPTIONS)):
+    _build_city_keyboard(_mask)
+
+
+# ========== UPDATE PROCESSING ==========
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates from different chats concurrently, but one at a time per chat.
+    
+    ConversationHandler relies on a conversation's updates being handled in
+    order: with plain concurrent_updates, two fast toggles from one user could
+    edit the keyboard out of order (checkmarks no longer matching
+    selected_mask), or a toggle could run while "המשך" is still saving.
+    Queueing each chat's updates behind a per-chat lock keeps every
+    conversation sequential while other users are served in parallel.
+    
+    Note:
+        Updates without a chat (none with the allowed update types) share
+        one lock. Locks are dropped once their chat has nothing queued.
+        The chat lock is taken before the concurrency semaphore, so a chat
+        with many queued presses holds at most one slot and can't starve
+        other chats.
+    """
+
+    __slots__ = ("_chat_locks", "_chat_waiters")
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks: dict[int | None, asyncio.Lock] = {}
+        self._chat_waiters: dict[int | None, int] = {}
+
+    async def process_update(self, update: object, coroutine) -> None:  # type: ignore[misc]
+        """Wait for the update's chat lock, then for a concurrency slot."""
+        chat = update.effective_chat if isinstance(update, Update) else None
+        key = chat.id if chat else None
+
+        lock = self._chat_locks.setdefault(key, asyncio.Lock())
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        """Await the update's coroutine (ordering is handled in process_update)."""
+        await coroutine
+
+    async def initialize(self) -> None:
+        """Nothing to set up."""
+
+    async def shutdown(self) -> None:
+        """Nothing to clean up."""
 
 
 # ========== MAIN ==========
@@ -231,8 +331,11 @@ def main() -> None:
     Initialize and run the Telegram bot.
     
     Setup Process:
+        0. Acquire the single-instance lock - exit if another bot is running
+           (already held when started from main.py, which takes it first)
         1. Initialize database schema (create tables if needed)
-        2. Build Telegram application with bot token
+        2. Build Telegram application with bot token and separate HTTP
+           connection pools for outgoing calls and getUpdates
         3. Configure conversation handler with:
            - Entry point: /start command
            - States: CHOOSING_CITIES (handles inline button callbacks)
@@ -242,17 +345,40 @@ def main() -> None:
     Bot Behavior:
         - Listens for /start and /cancel commands
         - Handles inline keyboard button presses during city selection
+        - Processes updates from different chats concurrently, each chat's
+          updates in order (see PerChatUpdateProcessor)
+        - Long-polls with BOT_POLLING_TIMEOUT, requesting only message and
+          callback_query updates
         - Runs indefinitely until process is terminated
     
     Note:
-        This function blocks. Use in separate process via main.py
-        for parallel operation with checker bot.
+        This function blocks. main.py runs it in the main thread, next to
+        the checker bot's "CheckerBot" thread.
     """
+    # Two pollers on one token get 409 Conflict from Telegram - run only one
+    if not acquire_instance_lock(BOT_LOCK_FILE):
+        logger.error("Another bot instance is already running. Exiting.")
+        sys.exit(0)
+
     # Ensure database tables exist before starting bot
     init_db()
 
     # Build Telegram bot application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # - Outgoing calls (answerCallbackQuery, editMessageReplyMarkup, ...) get a large
+    #   connection pool so concurrent button presses don't queue behind each other
+    # - getUpdates long-polling uses its own small pool so it never starves sends
+    # - Updates from different chats run concurrently; one chat's updates stay
+    #   sequential, as ConversationHandler requires (see PerChatUpdateProcessor)
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .request(HTTPXRequest(
+            connection_pool_size=64, read_timeout=20, connect_timeout=5, pool_timeout=1
+        ))
+        .get_updates_request(HTTPXRequest(connection_pool_size=8))
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .build()
+    )
 
     # Configure multi-step conversation flow
     conv_handler = ConversationHandler(
@@ -266,7 +392,12 @@ def main() -> None:
     application.add_handler(conv_handler)
 
     logger.info("Bot started successfully.")
-    application.run_polling()  # Start long-polling (blocks)
+    # Start long-polling (blocks)
+    application.run_polling(
+        timeout=BOT_POLLING_TIMEOUT,
+        poll_interval=0.0,
+        allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],
+    )
 
 
 if __name__ == "__main__":